@@ -1,15 +1,17 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import text
 from sqlalchemy import desc
+from sqlalchemy import delete
 from sqlalchemy.sql import func
-from typing import List
-from datetime import datetime, timedelta
-from . import models, schemas, auth, database, worker
+from typing import List, Optional, Literal
+from datetime import datetime, timedelta, timezone
+from . import models, schemas, auth, database, worker, migrations
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+import asyncio
 import os
 
 app = FastAPI(title="SoundStock API")
@@ -29,20 +31,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Создание таблиц при старте (для простоты, в продакшене лучше использовать Alembic)
+# Схема БД создаётся и обновляется миграциями вне процесса API: `python -m app.migrations`.
+# Старт не ждёт ни DDL, ни Last.fm — первичная загрузка рынка идёт в фоне.
+READINESS_DB_TIMEOUT = 1.0
+WARMUP_RETRY_INITIAL = 5.0
+WARMUP_RETRY_MAX = 300.0
+
+async def warm_up():
+    # Экземпляр готов, как только в БД есть любые данные рынка; устаревшие данные обновляются
+    # в фоне с экспоненциальной задержкой, не блокируя готовность
+    delay = WARMUP_RETRY_INITIAL
+    while True:
+        if not app.state.market_warm and await worker.market_data_available():
+            app.state.market_warm = True
+        if await worker.warm_market_data():
+            app.state.market_warm = True
+            return
+        app.state.market_warmup_failures += 1
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_MAX)
+
 @app.on_event("startup")
 async def startup():
-    async with database.engine.begin() as conn:
-        await conn.run_sync(models.Base.metadata.create_all)
-        await conn.execute(text("ALTER TABLE IF EXISTS users ADD COLUMN IF NOT EXISTS display_name VARCHAR"))
-        await conn.execute(text("ALTER TABLE IF EXISTS users ADD COLUMN IF NOT EXISTS avatar_url VARCHAR"))
-        await conn.execute(text("ALTER TABLE IF EXISTS users ADD COLUMN IF NOT EXISTS balance INTEGER DEFAULT 10000000"))
-        await conn.execute(text("ALTER TABLE IF EXISTS portfolio_items ADD COLUMN IF NOT EXISTS purchase_price INTEGER"))
+    app.state.market_warm = False
+    app.state.market_warmup_failures = 0
     app.state.scheduler = AsyncIOScheduler()
-    app.state.scheduler.add_job(worker.update_market_data, "interval", hours=1)
+    app.state.scheduler.add_job(
+        worker.update_market_data, "interval", seconds=worker.MARKET_UPDATE_INTERVAL.total_seconds()
+    )
     app.state.scheduler.add_job(worker.pay_daily_dividends, "interval", minutes=10)
     app.state.scheduler.start()
-    await worker.update_market_data()
+    app.state.warmup_task = asyncio.create_task(warm_up())
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.warmup_task.cancel()
+    app.state.scheduler.shutdown(wait=False)
+
+# --- Health Routes ---
+
+async def check_database():
+    async with database.engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        return await migrations.schema_is_current(conn)
+
+@app.get("/health/ready", response_model=schemas.HealthStatus)
+async def health_ready(response: Response):
+    db_ok = False
+    schema_ok = False
+    try:
+        schema_ok = await asyncio.wait_for(check_database(), timeout=READINESS_DB_TIMEOUT)
+        db_ok = True
+    except Exception:
+        pass
+    market_warm = bool(getattr(app.state, "market_warm", False))
+    market_warmup_failures = int(getattr(app.state, "market_warmup_failures", 0))
+    ready = db_ok and schema_ok and market_warm
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {
+        "ready": ready,
+        "database": db_ok,
+        "schema_current": schema_ok,
+        "market_warm": market_warm,
+        "market_warmup_failures": market_warmup_failures,
+    }
 
 # --- Auth Routes ---
 
@@ -224,6 +277,9 @@ async def reset_me(
     for t in tx_res.scalars().all():
         await db.delete(t)
 
+    # Delete equity history
+    await db.execute(delete(models.PortfolioSnapshot).where(models.PortfolioSnapshot.user_id == current_user.id))
+
     # Reset balance
     current_user.balance = 10000000 # Default balance
     db.add(current_user)
@@ -233,6 +289,71 @@ async def reset_me(
     
     return {"detail": "Account reset successful", "new_balance": current_user.balance}
 
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Снимки хранятся в наивном UTC, как TrackHistory и Transaction
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+# Автоматический даунсэмплинг по длине диапазона: сырые снимки (~7 в час) только для коротких окон
+EQUITY_RAW_MAX_SPAN = timedelta(days=2)
+EQUITY_DEFAULT_BUCKETS = [
+    (timedelta(days=31), "hour"),
+    (timedelta(days=366), "day"),
+]
+
+def default_equity_bucket(span: timedelta) -> Optional[str]:
+    if span <= EQUITY_RAW_MAX_SPAN:
+        return None
+    for max_span, bucket in EQUITY_DEFAULT_BUCKETS:
+        if span <= max_span:
+            return bucket
+    return "week"
+
+@app.get("/me/equity", response_model=List[schemas.EquityPoint])
+async def get_equity(
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    bucket: Optional[Literal["hour", "day", "week", "month"]] = Query(None),
+    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(database.get_db)
+):
+    start = to_naive_utc(start)
+    end = to_naive_utc(end)
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    ts = models.PortfolioSnapshot.ts
+    if bucket is None:
+        range_start = start
+        if range_start is None:
+            first_ts_res = await db.execute(
+                select(func.min(ts)).where(models.PortfolioSnapshot.user_id == current_user.id)
+            )
+            range_start = first_ts_res.scalar()
+        if range_start is not None:
+            bucket = default_equity_bucket((end or datetime.utcnow()) - range_start)
+
+    query = select(ts, models.PortfolioSnapshot.net_worth, models.PortfolioSnapshot.balance).where(
+        models.PortfolioSnapshot.user_id == current_user.id
+    )
+    if start:
+        query = query.where(ts >= start)
+    if end:
+        query = query.where(ts <= end)
+    if bucket:
+        # Даунсэмплинг: последний снимок в каждом интервале (DISTINCT ON поверх скана индекса)
+        bucket_expr = func.date_trunc(bucket, ts)
+        query = query.distinct(bucket_expr).order_by(bucket_expr, ts.desc())
+    else:
+        query = query.order_by(ts.asc())
+
+    result = await db.execute(query)
+    return [
+        {"timestamp": r_ts, "net_worth": int(net_worth), "balance": int(balance)}
+        for r_ts, net_worth, balance in result.all()
+    ]
+
 # --- Leaderboard Routes ---
 
 @app.get("/leaderboard", response_model=List[schemas.LeaderboardItem])
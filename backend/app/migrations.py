@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from sqlalchemy import text
+from . import database
+
+logger = logging.getLogger("migrations")
+
+# Произвольный ключ для pg_advisory_lock: не даёт двум раннерам мигрировать одновременно
+MIGRATION_LOCK_ID = 727001
+
+# Версионированные миграции: (версия, описание, список DDL).
+# Новые миграции только добавляются в конец, уже применённые не редактируются.
+MIGRATIONS = [
+    (1, "baseline schema", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email VARCHAR NOT NULL,
+            hashed_password VARCHAR NOT NULL,
+            display_name VARCHAR,
+            avatar_url VARCHAR,
+            balance INTEGER NOT NULL DEFAULT 10000000,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+        """,
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS display_name VARCHAR",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS avatar_url VARCHAR",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS balance INTEGER DEFAULT 10000000",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+        "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+        """
+        CREATE TABLE IF NOT EXISTS portfolio_items (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            artist_name VARCHAR NOT NULL,
+            track_name VARCHAR NOT NULL,
+            image_url VARCHAR,
+            mbid VARCHAR,
+            purchase_price INTEGER,
+            added_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+        """,
+        "ALTER TABLE portfolio_items ADD COLUMN IF NOT EXISTS purchase_price INTEGER",
+        "CREATE INDEX IF NOT EXISTS ix_portfolio_items_id ON portfolio_items (id)",
+        "CREATE INDEX IF NOT EXISTS ix_portfolio_items_user_id ON portfolio_items (user_id)",
+        """
+        CREATE TABLE IF NOT EXISTS track_history (
+            id SERIAL PRIMARY KEY,
+            artist_name VARCHAR NOT NULL,
+            track_name VARCHAR NOT NULL,
+            playcount BIGINT NOT NULL,
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_track_history_id ON track_history (id)",
+        "CREATE INDEX IF NOT EXISTS ix_track_history_artist_name ON track_history (artist_name)",
+        "CREATE INDEX IF NOT EXISTS ix_track_history_track_name ON track_history (track_name)",
+        """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            track_name VARCHAR,
+            artist_name VARCHAR,
+            transaction_type VARCHAR NOT NULL,
+            amount DOUBLE PRECISION NOT NULL,
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_transactions_id ON transactions (id)",
+        "CREATE INDEX IF NOT EXISTS ix_transactions_user_id ON transactions (user_id)",
+    ]),
+    (2, "portfolio snapshots", [
+        """
+        CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            ts TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            balance BIGINT NOT NULL,
+            net_worth BIGINT NOT NULL,
+            PRIMARY KEY (user_id, ts)
+        )
+        """,
+        # Последняя цена трека для оценки активов в снимках — один index scan на позицию
+        "CREATE INDEX IF NOT EXISTS ix_track_history_artist_track_ts "
+        "ON track_history (artist_name, track_name, timestamp)",
+    ]),
+]
+
+async def current_version(conn) -> int:
+    result = await conn.execute(text("SELECT coalesce(max(version), 0) FROM schema_migrations"))
+    return int(result.scalar() or 0)
+
+async def run_migrations():
+    async with database.engine.connect() as conn:
+        await conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        await conn.commit()
+        try:
+            async with conn.begin():
+                await conn.execute(text(
+                    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                    "version INTEGER PRIMARY KEY, "
+                    "description VARCHAR NOT NULL, "
+                    "applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now())"
+                ))
+            async with conn.begin():
+                applied = await current_version(conn)
+            pending = [m for m in MIGRATIONS if m[0] > applied]
+            if not pending:
+                logger.info(f"Schema is up to date (version {applied})")
+                return
+            for version, description, statements in pending:
+                # Каждая миграция — отдельная транзакция вместе с записью о версии
+                async with conn.begin():
+                    for stmt in statements:
+                        await conn.execute(text(stmt))
+                    await conn.execute(
+                        text("INSERT INTO schema_migrations (version, description) VALUES (:v, :d)"),
+                        {"v": version, "d": description},
+                    )
+                logger.info(f"Applied migration {version}: {description}")
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+            await conn.commit()
+
+async def schema_is_current(conn) -> bool:
+    latest = MIGRATIONS[-1][0]
+    try:
+        return await current_version(conn) >= latest
+    except Exception:
+        return False
+
+async def _main():
+    try:
+        await run_migrations()
+    finally:
+        await database.engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -40,6 +40,10 @@ class TrackHistory(Base):
     playcount = Column(BigInteger, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        Index("ix_track_history_artist_track_ts", "artist_name", "track_name", "timestamp"),
+    )
+
 class Transaction(Base):
     __tablename__ = "transactions"
 
@@ -50,3 +54,12 @@ class Transaction(Base):
     transaction_type = Column(String, nullable=False)
     amount = Column(Float, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class PortfolioSnapshot(Base):
+    __tablename__ = "portfolio_snapshots"
+
+    # Составной первичный ключ (user_id, ts) — он же индекс для выборки диапазона
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ts = Column(DateTime, primary_key=True)
+    balance = Column(BigInteger, nullable=False)
+    net_worth = Column(BigInteger, nullable=False)
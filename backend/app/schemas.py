@@ -45,10 +45,22 @@ class ChangePassword(BaseModel):
     old_password: str
     new_password: str
 
+class HealthStatus(BaseModel):
+    ready: bool
+    database: bool
+    schema_current: bool
+    market_warm: bool
+    market_warmup_failures: int
+
 class TrackHistoryPoint(BaseModel):
     timestamp: datetime
     price: int
 
+class EquityPoint(BaseModel):
+    timestamp: datetime
+    net_worth: int
+    balance: int
+
 class MarketSnapshotItem(BaseModel):
     artist_name: str
     track_name: str
@@ -1,7 +1,9 @@
 import os
 import logging
 import httpx
+from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, literal, DateTime
 from sqlalchemy.future import select
 from sqlalchemy.sql import func
 from . import database, models
@@ -9,12 +11,15 @@ from . import database, models
 logger = logging.getLogger("market_worker")
 
 LASTFM_URL = "http://ws.audioscrobbler.com/2.0/"
+MARKET_UPDATE_INTERVAL = timedelta(hours=1)
+# С запасом больше интервала: перезапуск рядом с часовой отметкой не должен ходить в Last.fm
+MARKET_DATA_MAX_AGE = MARKET_UPDATE_INTERVAL * 2
 
 async def update_market_data():
     api_key = os.getenv("LASTFM_API_KEY")
     if not api_key:
         logger.warning("LASTFM_API_KEY is not set; skipping market data update")
-        return
+        return False
 
     params = {
         "method": "chart.gettoptracks",
@@ -31,7 +36,7 @@ async def update_market_data():
     tracks = (data.get("tracks", {}) or {}).get("track", []) or []
     if not isinstance(tracks, list):
         logger.warning("Unexpected Last.fm response format")
-        return
+        return False
 
     async with database.SessionLocal() as session:  # type: AsyncSession
         for t in tracks:
@@ -52,6 +57,37 @@ async def update_market_data():
         await session.commit()
 
     logger.info(f"Market data updated: {len(tracks)} tracks saved")
+    await snapshot_portfolios()
+    return True
+
+async def market_data_available() -> bool:
+    # Для готовности достаточно любых данных рынка; без ключа Last.fm ждать нечего
+    if not os.getenv("LASTFM_API_KEY"):
+        return True
+    try:
+        async with database.SessionLocal() as session:  # type: AsyncSession
+            result = await session.execute(select(models.TrackHistory.id).limit(1))
+            return result.first() is not None
+    except Exception:
+        logger.exception("Failed to check market data availability")
+        return False
+
+async def warm_market_data() -> bool:
+    # True, если загрузка не нужна (данные свежие или нет ключа) или прошла успешно
+    if not os.getenv("LASTFM_API_KEY"):
+        logger.warning("LASTFM_API_KEY is not set; skipping initial market data ingest")
+        return True
+    try:
+        async with database.SessionLocal() as session:  # type: AsyncSession
+            result = await session.execute(select(func.max(models.TrackHistory.timestamp)))
+            latest_ts = result.scalar()
+        if latest_ts and datetime.utcnow() - latest_ts < MARKET_DATA_MAX_AGE:
+            logger.info(f"Market data is fresh (last update {latest_ts}); skipping initial ingest")
+            return True
+        return await update_market_data()
+    except Exception:
+        logger.exception("Initial market data ingest failed")
+        return False
 
 async def pay_daily_dividends():
     async with database.SessionLocal() as session:  # type: AsyncSession
@@ -82,3 +118,41 @@ async def pay_daily_dividends():
             count += 1
         await session.commit()
     logger.info(f"Dividends paid to {count} users")
+    await snapshot_portfolios()
+
+async def snapshot_portfolios():
+    # Один INSERT ... SELECT на всех пользователей; активы оцениваются по последнему playcount
+    # из TrackHistory (цена /market/snapshot), purchase_price — если истории по треку нет
+    ts = datetime.utcnow()
+    market_price = (
+        select(models.TrackHistory.playcount)
+        .where(
+            models.TrackHistory.artist_name == models.PortfolioItem.artist_name,
+            models.TrackHistory.track_name == models.PortfolioItem.track_name,
+        )
+        .order_by(models.TrackHistory.timestamp.desc())
+        .limit(1)
+        .correlate(models.PortfolioItem)
+        .scalar_subquery()
+    )
+    holding_value = func.coalesce(market_price, models.PortfolioItem.purchase_price, 0)
+    balance_expr = func.coalesce(models.User.balance, 10000000)
+    net_worth_expr = balance_expr + func.coalesce(func.sum(holding_value), 0)
+    source = (
+        select(
+            models.User.id,
+            literal(ts, DateTime),
+            balance_expr,
+            net_worth_expr,
+        )
+        .outerjoin(models.PortfolioItem, models.PortfolioItem.user_id == models.User.id)
+        .group_by(models.User.id)
+    )
+    async with database.SessionLocal() as session:  # type: AsyncSession
+        result = await session.execute(
+            insert(models.PortfolioSnapshot).from_select(
+                ["user_id", "ts", "balance", "net_worth"], source
+            )
+        )
+        await session.commit()
+    logger.info(f"Portfolio snapshots saved for {result.rowcount} users")